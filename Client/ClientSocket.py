@@ -1,31 +1,100 @@
+import os
 import socket
-from pynput import keyboard
+import sys
 
-server = socket.socket() 
-server.connect(("192.168.50.150", 6678))
+# Robot address, overridable with ROBOT_HOST / ROBOT_PORT; resolved once up front
+HOST = os.environ.get("ROBOT_HOST", "192.168.50.150")
+PORT = int(os.environ.get("ROBOT_PORT", "6678"))
+family, socktype, proto, _, address = socket.getaddrinfo(HOST, PORT, socket.AF_INET, socket.SOCK_STREAM)[0]
+
+server = socket.socket(family, socktype, proto)
+server.connect(address)
+server.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # send each keystroke immediately
 print("Successful connection to PiRobot socket")
 
+def keycode(key):
+    """Character for printable keys, name for special keys (e.g. 'space')."""
+    return getattr(key, 'char', None) or getattr(key, 'name', None)
+
+def encode(ch, pressed):
+    """2-byte record: the key character, then 1 for press or 0 for release."""
+    return bytes((ord(ch), pressed))
+
+# Records for the keys the robot understands, encoded once; release of '+' asks the server to exit.
+# Any other key is not sent, since the server would only discard it.
+PRESS = {key: encode(key, 1) for key in 'wasd'}
+RELEASE = {key: encode(key, 0) for key in 'wasd+'}
+
 def on_key_release(key):
-    exit_key = '%s' % key
-    if exit_key == '\'+\'':
-        message = 'exit'
-    else:
-        message = '%s release' % key
-    message = message.encode()
-    server.send(message)
-    print('Released Key %s' % key)
+    ch = keycode(key)
+    message = RELEASE.get(ch)
+    if message is not None:
+        server.send(message)
+    print('Released Key %s' % ch)
     #msg = server.recv(1024)
     #print("Message from server : " + msg.decode())
 
 def on_key_press(key):
-    message = '%s press' % key
-    message = message.encode()
-    server.send(message)
-    print('Pressed Key %s' % key)
+    ch = keycode(key)
+    message = PRESS.get(ch)
+    if message is not None:
+        server.send(message)
+    print('Pressed Key %s' % ch)
     #msg = server.recv(1024)
     #print("Message from server : " + msg.decode())
 
-with keyboard.Listener(
-    on_press = on_key_press,
-    on_release = on_key_release) as listener:
-    listener.join()
+def find_keyboard():
+    """Return an evdev keyboard on Linux (ROBOT_KBD_DEVICE or the first device with a W key), else None."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import evdev # type: ignore
+    except ImportError:
+        return None
+    try:
+        path = os.environ.get("ROBOT_KBD_DEVICE")
+        if path:
+            return evdev.InputDevice(path)
+        for path in evdev.list_devices():
+            device = evdev.InputDevice(path)
+            if evdev.ecodes.KEY_W in device.capabilities().get(evdev.ecodes.EV_KEY, []):
+                return device
+            device.close()
+    except OSError as exc:
+        print('Cannot read keyboard device (%s), falling back to pynput' % exc)
+    return None
+
+def listen_evdev(device):
+    from evdev import ecodes # type: ignore
+
+    # (key code, value) -> message; value 1 is press, 0 is release, 2 (autorepeat) is ignored
+    messages = {(ecodes.KEY_KPPLUS, 0): RELEASE['+']}
+    for key in 'wasd':
+        code = ecodes.ecodes['KEY_' + key.upper()]
+        messages[(code, 1)] = PRESS[key]
+        messages[(code, 0)] = RELEASE[key]
+
+    print('Reading keys from %s' % device.path)
+    for event in device.read_loop():
+        if event.type != ecodes.EV_KEY:
+            continue
+        message = messages.get((event.code, event.value))
+        if message is not None:
+            server.send(message)
+            if message == RELEASE['+']:
+                break
+
+def listen_pynput():
+    from pynput import keyboard
+
+    with keyboard.Listener(
+        on_press = on_key_press,
+        on_release = on_key_release) as listener:
+        listener.join()
+
+# Read the keyboard directly on Linux when possible; pynput goes through X11 and its own callback thread
+keyboard_device = find_keyboard()
+if keyboard_device is not None:
+    listen_evdev(keyboard_device)
+else:
+    listen_pynput()
@@ -1,64 +1,43 @@
+import logging
 import socket
 import threading
+from time import sleep
 import signal
-import RPi.GPIO as gpio # type: ignore
 
+from Server.config import HOST, PORT, setup_logging, tune_client_socket
+from Server.controllers import RPiGpioRobotController
+from Server.robot_fsm import RECORD_SIZE, RELEASED, STATE_NAMES, apply_record, step
 
-previousstate = 0 # 0 1 2 3 4 none forward backward left right
-forwardvar = 0
-backwardvar = 0
-leftvar = 0
-rightvar = 0
+
+log = logging.getLogger("robot")
+
+keystate = list(RELEASED) # forward backward left right
 exit_program = 0
 
-def initialize():
-    gpio.setmode(gpio.BOARD)
-    gpio.setup(35, gpio.OUT) #left side
-    gpio.setup(37, gpio.OUT) #left side
-    gpio.setup(36, gpio.OUT) #right side
-    gpio.setup(38, gpio.OUT) #right side
-
-
-def clear():
-    gpio.output(35, gpio.LOW)
-    gpio.output(37, gpio.LOW)
-    gpio.output(36, gpio.LOW)
-    gpio.output(38, gpio.LOW)
-
-def cleanup():
-    global previousstate
-    clear()
-    previousstate = 0
-    #gpio.output(11, gpio.LOW)
-    #gpio.output(13, gpio.LOW)
-
-def forward():
-    clear()
-    gpio.output(35, gpio.HIGH)
-    gpio.output(37, gpio.LOW)
-    gpio.output(36, gpio.HIGH)
-    gpio.output(38, gpio.LOW)
-
-def backward():
-    clear()
-    gpio.output(35, gpio.LOW)
-    gpio.output(37, gpio.HIGH)
-    gpio.output(36, gpio.LOW)
-    gpio.output(38, gpio.HIGH)
-
-def left():
-    clear()
-    gpio.output(35, gpio.HIGH)
-    gpio.output(37, gpio.LOW)
-    gpio.output(36, gpio.LOW)
-    gpio.output(38, gpio.HIGH)
-
-def right():
-    clear()
-    gpio.output(35, gpio.LOW)
-    gpio.output(37, gpio.HIGH)
-    gpio.output(36, gpio.HIGH)
-    gpio.output(38, gpio.LOW)
+state_lock = threading.Lock()
+state_changed = threading.Event()
+
+def dispatch(record):
+    """Apply one client record to the shared key state. Returns False once the client asks to exit."""
+    global exit_program
+    with state_lock:
+        result = apply_record(keystate, record)
+        if result is False:
+            exit_program = 1
+    if result is not None:
+        state_changed.set()
+        log.debug("%s", record)
+    return result is not False
+
+def release_keys():
+    """Drop every held key so the robot stops when its client goes away."""
+    with state_lock:
+        keystate[:] = RELEASED
+    state_changed.set()
+
+def exiting():
+    with state_lock:
+        return exit_program == 1
 
 class robotThread (threading.Thread):
   def __init__(self, threadID, name, counter):
@@ -68,70 +47,22 @@ class robotThread (threading.Thread):
     self.counter = counter
 
   def run(self):
-    global previousstate
-    global forwardvar
-    global backwardvar
-    global leftvar
-    global rightvar
-    global exit_program
+    previousstate = 0 # index into STATE_NAMES (owned by this thread)
 
-    gpio.setwarnings(False)
-    initialize()
     while True:
-        if exit_program == 1:
-            cleanup()
-            print("stopping robot thread")
+        state_changed.wait()
+        state_changed.clear()
+        with state_lock:
+            inputs = tuple(keystate)
+            ex = exit_program
+        if ex == 1:
+            controller.stop()
+            log.info("stopping robot thread")
             break
-        elif 0 == forwardvar and 0 == backwardvar and 0 == leftvar and 0 == rightvar and previousstate != 0:
-            previousstate = 0
-            clear()
-            print("clear")
-        elif forwardvar == 1 and backwardvar == 1 and leftvar == 1 and rightvar == 1 and previousstate != 0:
-            previousstate = 0
-            clear()
-        elif forwardvar == 0 and backwardvar == 0 and leftvar == 1 and rightvar == 1 and previousstate != 0:
-            previousstate = 0
-            clear()
-        elif forwardvar == 1 and backwardvar == 1 and leftvar == 0 and rightvar == 0 and previousstate != 0:
-            previousstate = 0
-            clear()
-        elif forwardvar == 1 and backwardvar == 0 and leftvar == 0 and rightvar == 0 and previousstate != 1:
-            forward()
-            previousstate = 1
-            print("forward")
-        elif forwardvar == 1 and backwardvar == 0 and leftvar == 1 and rightvar == 0 and previousstate == 3:
-            forward()
-            previousstate = 1
-        elif forwardvar == 1 and backwardvar == 0 and leftvar == 0 and rightvar == 1 and previousstate == 4:
-            forward()
-            previousstate = 1
-        elif forwardvar == 1 and backwardvar == 0 and leftvar == 1 and rightvar == 1 and previousstate != 1:
-            forward()
-            previousstate = 1
-        elif forwardvar == 0 and backwardvar == 1 and leftvar == 0 and rightvar == 0 and previousstate != 2:
-            backward()
-            previousstate = 2
-        elif forwardvar == 0 and backwardvar == 1 and leftvar == 1 and rightvar == 0 and previousstate == 3:
-            backward()
-            previousstate = 2
-        elif forwardvar == 0 and backwardvar == 1 and leftvar == 0 and rightvar == 1 and previousstate == 4:
-            backward()
-            previousstate = 2
-        elif forwardvar == 0 and backwardvar == 1 and leftvar == 1 and rightvar == 1 and previousstate != 2:
-            backward()
-            previousstate = 2
-        elif forwardvar == 0 and backwardvar == 0 and leftvar == 1 and rightvar == 0 and previousstate != 3:
-            left()
-            previousstate = 3
-        elif forwardvar == 1 and backwardvar == 1 and leftvar == 1 and rightvar == 0 and previousstate != 3:
-            left()
-            previousstate = 3
-        elif forwardvar == 0 and backwardvar == 0 and leftvar == 0 and rightvar == 1 and previousstate != 4:
-            right()
-            previousstate = 4
-        elif forwardvar == 1 and backwardvar == 1 and leftvar == 0 and rightvar == 1 and previousstate != 4:
-            right()
-            previousstate = 4
+        new_state = step(previousstate, inputs, controller)
+        if new_state != previousstate:
+            previousstate = new_state
+            log.debug(STATE_NAMES[new_state])
 
 class socketThread (threading.Thread):
    def __init__(self, threadID, name, counter):
@@ -141,70 +72,52 @@ class socketThread (threading.Thread):
       self.counter = counter
 
    def run(self):
-    global forwardvar
-    global backwardvar
-    global leftvar
-    global rightvar
-    global exit_program
     #message = 'Send message to client.'
     #message = message.encode()
 
     #socket.setdefaulttimeout(10)
     server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-    server.bind(("192.168.50.177", 6678))
+    server.bind((HOST, PORT))
+    server.listen(4)
 
-    while True:
+    failures = 0
+    while not exiting():
         try:
-            server.listen(4)
             client_socket, client_address = server.accept()
             #except socket.timeout:
                 #server.close()
                 #print("Server timeout. Exiting..")
                 #os._exit(1)
-
-            print(client_address, "has connected")
-
-            while True:
-                received_data = client_socket.recv(1024)
-                #client_socket.send(message)
-                decoded_data = received_data.decode()
-                
-                if decoded_data == 'exit':
-                    exit_program = 1
-                    client_socket.close()
-                    print(decoded_data)
-                    break
-                elif decoded_data == '\'w\' press':
-                    forwardvar = 1
-                    print(decoded_data)
-                elif decoded_data == '\'w\' release':
-                    forwardvar = 0
-                    print(decoded_data)
-                elif decoded_data == '\'a\' press':
-                    leftvar = 1
-                    print(decoded_data)
-                elif decoded_data == '\'a\' release':
-                    leftvar = 0
-                    print(decoded_data)
-                elif decoded_data == '\'s\' press':
-                    backwardvar = 1
-                    print(decoded_data)
-                elif decoded_data == '\'s\' release':
-                    backwardvar = 0
-                    print(decoded_data)
-                elif decoded_data == '\'d\' press':
-                    rightvar = 1
-                    print(decoded_data)
-                elif decoded_data == '\'d\' release':
-                    rightvar = 0
-                    print(decoded_data)
-        except:
-            if exit_program == 1:
-                print(client_address, "has disconnected")
-                break
-            else:
-                pass
+        except OSError as exc:
+            # Back off instead of spinning when accept() keeps failing; 0.01 * 2**7 already exceeds the 1 s cap
+            failures = min(failures + 1, 7)
+            log.warning("accept failed (%s), retrying", exc)
+            sleep(min(1.0, 0.01 * 2 ** failures))
+            continue
+        failures = 0
+
+        log.info("%s has connected", client_address)
+        try:
+            tune_client_socket(client_socket)
+
+            with client_socket.makefile('rb') as stream:
+                while True:
+                    record = stream.read(RECORD_SIZE)
+                    if len(record) < RECORD_SIZE or not dispatch(record):
+                        break
+        except OSError as exc:
+            log.warning("%s connection error: %s", client_address, exc)
+        finally:
+            client_socket.close()
+            # Stop on disconnect to avoid runaway
+            release_keys()
+        log.info("%s has disconnected", client_address)
+    server.close()
+
+log_listener = setup_logging()
+controller = RPiGpioRobotController()
 
 threads = []
 RobotThread = robotThread(1, "RobotThread", 1)
@@ -217,4 +130,5 @@ threads.append(RobotThread)
 threads.append(SocketThread)
 for t in threads:
     t.join()
-print("Program exited cleanly.")
\ No newline at end of file
+log.info("Program exited cleanly.")
+log_listener.stop()
\ No newline at end of file
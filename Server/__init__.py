@@ -0,0 +1 @@
+"""Legacy socket servers and the robot code they share with the web app."""
@@ -0,0 +1,32 @@
+"""Settings, logging and socket setup shared by the socket servers."""
+
+import logging
+import logging.handlers
+import os
+import queue
+import socket
+
+# Listening address, overridable with ROBOT_HOST / ROBOT_PORT
+HOST = os.environ.get("ROBOT_HOST", "0.0.0.0")
+PORT = int(os.environ.get("ROBOT_PORT", "6678"))
+
+def setup_logging():
+    """Route log records through a queue so the socket and motor code never block on stdio.
+
+    Per-message and per-transition records are DEBUG; set ROBOT_DEBUG=1 to see them.
+    """
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(threadName)s %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(logging.DEBUG if os.environ.get("ROBOT_DEBUG", "0") == "1" else logging.INFO)
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    return listener
+
+def tune_client_socket(client_socket):
+    """Send and acknowledge small key records immediately instead of waiting to coalesce them."""
+    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if hasattr(socket, "TCP_QUICKACK"): # Linux only
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
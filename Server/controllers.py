@@ -0,0 +1,124 @@
+"""Motor controllers shared by the socket servers and the web app."""
+
+from typing import List, Tuple
+
+
+class BaseRobotController:
+    """Abstract motor controller. Real implementations drive the Pi GPIO; development uses a mock."""
+
+    def forward(self) -> None:
+        raise NotImplementedError
+
+    def backward(self) -> None:
+        raise NotImplementedError
+
+    def left(self) -> None:
+        raise NotImplementedError
+
+    def right(self) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        raise NotImplementedError
+
+
+class MockRobotController(BaseRobotController):
+    def __init__(self, verbose: bool = True) -> None:
+        self._last_cmd: str = "stop"
+        self.verbose = verbose
+
+    def _log(self, cmd: str) -> None:
+        if cmd != self._last_cmd:
+            if self.verbose:
+                print(f"[MOCK ROBOT] {cmd}")
+            self._last_cmd = cmd
+
+    def forward(self) -> None:
+        self._log("forward")
+
+    def backward(self) -> None:
+        self._log("backward")
+
+    def left(self) -> None:
+        self._log("left")
+
+    def right(self) -> None:
+        self._log("right")
+
+    def stop(self) -> None:
+        self._log("stop")
+
+
+class GpioZeroRobotController(BaseRobotController):
+    def __init__(self, left_forward_pin: int, left_backward_pin: int, right_forward_pin: int, right_backward_pin: int) -> None:
+        # Defer import so development machines without gpiozero still run
+        import gpiozero as gpio  # type: ignore
+
+        left_motor = gpio.Motor(forward=left_forward_pin, backward=left_backward_pin)
+        right_motor = gpio.Motor(forward=right_forward_pin, backward=right_backward_pin)
+        self.robot = gpio.Robot(left=left_motor, right=right_motor)
+
+    def forward(self) -> None:
+        self.robot.forward()
+
+    def backward(self) -> None:
+        self.robot.backward()
+
+    def left(self) -> None:
+        self.robot.left()
+
+    def right(self) -> None:
+        self.robot.right()
+
+    def stop(self) -> None:
+        self.robot.stop()
+
+
+class RPiGpioRobotController(BaseRobotController):
+    """Drives the motor driver inputs directly with RPi.GPIO (BOARD numbering).
+
+    RPi.GPIO writes a channel list one pin at a time, so a command is not an atomic group
+    write. Pins that go LOW are written before pins that go HIGH, so a direction reversal
+    never drives both inputs of an H-bridge HIGH, even briefly.
+    """
+
+    def __init__(self, pins: Tuple[int, int, int, int] = (35, 37, 36, 38)) -> None:
+        # Pins are left forward, left backward, right forward, right backward
+        import RPi.GPIO as gpio  # type: ignore
+
+        self.gpio = gpio
+        self.pins = pins
+        gpio.setwarnings(False)
+        gpio.setmode(gpio.BOARD)
+        gpio.setup(pins, gpio.OUT, initial=gpio.LOW)
+        self._forward = self._split((1, 0, 1, 0))
+        self._backward = self._split((0, 1, 0, 1))
+        self._left = self._split((1, 0, 0, 1))
+        self._right = self._split((0, 1, 1, 0))
+        self._stop = self._split((0, 0, 0, 0))
+
+    def _split(self, levels: Tuple[int, int, int, int]) -> Tuple[List[int], List[int]]:
+        low = [pin for pin, level in zip(self.pins, levels) if not level]
+        high = [pin for pin, level in zip(self.pins, levels) if level]
+        return low, high
+
+    def _drive(self, pins: Tuple[List[int], List[int]]) -> None:
+        low, high = pins
+        self.gpio.output(low, self.gpio.LOW)
+        if high:
+            self.gpio.output(high, self.gpio.HIGH)
+
+    def forward(self) -> None:
+        self._drive(self._forward)
+
+    def backward(self) -> None:
+        self._drive(self._backward)
+
+    def left(self) -> None:
+        self._drive(self._left)
+
+    def right(self) -> None:
+        self._drive(self._right)
+
+    def stop(self) -> None:
+        self._drive(self._stop)
@@ -0,0 +1,79 @@
+"""Robot state machine shared by the socket servers.
+
+Inputs are four key flags (forward, backward, left, right) and the robot is in one of
+STATE_NAMES; step() moves a controller (see controllers.py) to the state for the inputs.
+"""
+
+# Client messages are 2-byte records: the key character, then 1 for press or 0 for release
+RECORD_SIZE = 2
+EXIT = b"+\x00" # release of '+'
+COMMANDS = {
+    b"w\x01": (0, 1),
+    b"w\x00": (0, 0),
+    b"s\x01": (1, 1),
+    b"s\x00": (1, 0),
+    b"a\x01": (2, 1),
+    b"a\x00": (2, 0),
+    b"d\x01": (3, 1),
+    b"d\x00": (3, 0),
+}
+
+RELEASED = (0, 0, 0, 0) # key state with nothing held
+
+def apply_record(keystate, record):
+    """Apply one client record to keystate (a list of four flags) in place.
+
+    Returns False for the exit record, True when a key flag was written and None for
+    records the robot does not understand.
+    """
+    if record == EXIT:
+        return False
+    cmd = COMMANDS.get(record)
+    if cmd is None:
+        return None
+    index, value = cmd
+    keystate[index] = value
+    return True
+
+STATE_NAMES = ("clear", "forward", "backward", "left", "right")
+# Controller method that enters each state
+ACTIONS = ("stop", "forward", "backward", "left", "right")
+
+# Key combinations (forward, backward, left, right) -> (state, required previous state).
+# A required previous state of None means the combination applies from any other state.
+COMBOS = {
+    (0, 0, 0, 0): (0, None),
+    (1, 1, 1, 1): (0, None),
+    (0, 0, 1, 1): (0, None),
+    (1, 1, 0, 0): (0, None),
+    (1, 0, 0, 0): (1, None),
+    (1, 0, 1, 0): (1, 3),
+    (1, 0, 0, 1): (1, 4),
+    (1, 0, 1, 1): (1, None),
+    (0, 1, 0, 0): (2, None),
+    (0, 1, 1, 0): (2, 3),
+    (0, 1, 0, 1): (2, 4),
+    (0, 1, 1, 1): (2, None),
+    (0, 0, 1, 0): (3, None),
+    (1, 1, 1, 0): (3, None),
+    (0, 0, 0, 1): (4, None),
+    (1, 1, 0, 1): (4, None),
+}
+
+def build_transitions():
+    """Expand COMBOS into {(f, b, l, r, previousstate): (action, new_state)} for every previous state."""
+    transitions = {}
+    for inputs, (new_state, required) in COMBOS.items():
+        for prev in range(len(STATE_NAMES)):
+            if new_state != prev and required in (None, prev):
+                transitions[inputs + (prev,)] = (ACTIONS[new_state], new_state)
+    return transitions
+
+TRANSITIONS = build_transitions()
+
+def step(previousstate, inputs, controller):
+    """Drive controller to the state for inputs (f, b, l, r) and return the new state."""
+    action, new_state = TRANSITIONS.get(tuple(inputs) + (previousstate,), (None, previousstate))
+    if action is not None:
+        getattr(controller, action)()
+    return new_state
@@ -1,201 +1,83 @@
-import gpiozero as gpio
-from time import sleep
-import socket
-import threading
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
-previousstate = 0 # 0 1 2 3 4 none forward backward left right
-forwardvar = 0
-backwardvar = 0
-leftvar = 0
-rightvar = 0
-exit_program = 0
+from Server.config import HOST, PORT, setup_logging, tune_client_socket
+from Server.controllers import GpioZeroRobotController
+from Server.robot_fsm import RECORD_SIZE, RELEASED, STATE_NAMES, apply_record, step
 
-#Definte motor pins using BCM format
-leftMotor = gpio.Motor(19,26) #GPIO 19 & 26 or Board Pins 35 & 37
-rightMotor = gpio.Motor(16, 20) #GPIO 16 & 20 or Board Pins 36 & 38
-robot = gpio.Robot(leftMotor, rightMotor)
-
-def main():
-
-    def clear():
-        robot.stop()
-
-    def cleanup():
-        global previousstate
-        clear()
-        previousstate = 0
-
-    def forward():
-        clear()
-        robot.forward()
-
-    def backward():
-        clear()
-        robot.backward()
-
-    def left():
-        clear()
-        robot.left()
-
-    def right():
-        clear()
-        robot.right()
-
-    class robotThread (threading.Thread):
-        def __init__(self, threadID, name, counter):
-            threading.Thread.__init__(self)
-            self.threadID = threadID
-            self.name = name
-            self.counter = counter
-
-        def run(self):
-            global previousstate
-            global forwardvar
-            global backwardvar
-            global leftvar
-            global rightvar
-            global exit_program
-
-            while True:
-                if exit_program == 1:
-                    cleanup()
-                    print("stopping robot thread")
-                    break
-                elif 0 == forwardvar and 0 == backwardvar and 0 == leftvar and 0 == rightvar and previousstate != 0:
-                    previousstate = 0
-                    clear()
-                    print("clear")
-                elif forwardvar == 1 and backwardvar == 1 and leftvar == 1 and rightvar == 1 and previousstate != 0:
-                    previousstate = 0
-                    clear()
-                elif forwardvar == 0 and backwardvar == 0 and leftvar == 1 and rightvar == 1 and previousstate != 0:
-                    previousstate = 0
-                    clear()
-                elif forwardvar == 1 and backwardvar == 1 and leftvar == 0 and rightvar == 0 and previousstate != 0:
-                    previousstate = 0
-                    clear()
-                elif forwardvar == 1 and backwardvar == 0 and leftvar == 0 and rightvar == 0 and previousstate != 1:
-                    forward()
-                    previousstate = 1
-                    print("forward")
-                elif forwardvar == 1 and backwardvar == 0 and leftvar == 1 and rightvar == 0 and previousstate == 3:
-                    forward()
-                    previousstate = 1
-                elif forwardvar == 1 and backwardvar == 0 and leftvar == 0 and rightvar == 1 and previousstate == 4:
-                    forward()
-                    previousstate = 1
-                elif forwardvar == 1 and backwardvar == 0 and leftvar == 1 and rightvar == 1 and previousstate != 1:
-                    forward()
-                    previousstate = 1
-                elif forwardvar == 0 and backwardvar == 1 and leftvar == 0 and rightvar == 0 and previousstate != 2:
-                    backward()
-                    previousstate = 2
-                elif forwardvar == 0 and backwardvar == 1 and leftvar == 1 and rightvar == 0 and previousstate == 3:
-                    backward()
-                    previousstate = 2
-                elif forwardvar == 0 and backwardvar == 1 and leftvar == 0 and rightvar == 1 and previousstate == 4:
-                    backward()
-                    previousstate = 2
-                elif forwardvar == 0 and backwardvar == 1 and leftvar == 1 and rightvar == 1 and previousstate != 2:
-                    backward()
-                    previousstate = 2
-                elif forwardvar == 0 and backwardvar == 0 and leftvar == 1 and rightvar == 0 and previousstate != 3:
-                    left()
-                    previousstate = 3
-                elif forwardvar == 1 and backwardvar == 1 and leftvar == 1 and rightvar == 0 and previousstate != 3:
-                    left()
-                    previousstate = 3
-                elif forwardvar == 0 and backwardvar == 0 and leftvar == 0 and rightvar == 1 and previousstate != 4:
-                    right()
-                    previousstate = 4
-                elif forwardvar == 1 and backwardvar == 1 and leftvar == 0 and rightvar == 1 and previousstate != 4:
-                    right()
-                    previousstate = 4
+log = logging.getLogger("robot")
 
-    class socketThread (threading.Thread):
-        def __init__(self, threadID, name, counter):
-            threading.Thread.__init__(self)
-            self.threadID = threadID
-            self.name = name
-            self.counter = counter
+# The key state is only touched from the event loop, so it needs no lock
+keystate = list(RELEASED) # forward backward left right
+state_changed = asyncio.Event()
+exit_program = asyncio.Event()
+clients = {} # writer -> handler task, so shutdown can close and wait for them
 
-        def run(self):
-            global forwardvar
-            global backwardvar
-            global leftvar
-            global rightvar
-            global exit_program
-            #message = 'Send message to client.'
-            #message = message.encode()
-
-            #socket.setdefaulttimeout(10)
-            server = socket.socket()
-
-            server.bind(("192.168.50.177", 6678))
-
-            while True:
-                try:
-                    server.listen(4)
-                    client_socket, client_address = server.accept()
-                    #except socket.timeout:
-                        #server.close()
-                        #print("Server timeout. Exiting..")
-                        #os._exit(1)
-
-                    print(client_address, "has connected")
-
-                    while True:
-                        received_data = client_socket.recv(1024)
-                        #client_socket.send(message)
-                        decoded_data = received_data.decode()
-                        
-                        if decoded_data == 'exit':
-                            exit_program = 1
-                            client_socket.close()
-                            print(decoded_data)
-                            break
-                        elif decoded_data == '\'w\' press':
-                            forwardvar = 1
-                            print(decoded_data)
-                        elif decoded_data == '\'w\' release':
-                            forwardvar = 0
-                            print(decoded_data)
-                        elif decoded_data == '\'a\' press':
-                            leftvar = 1
-                            print(decoded_data)
-                        elif decoded_data == '\'a\' release':
-                            leftvar = 0
-                            print(decoded_data)
-                        elif decoded_data == '\'s\' press':
-                            backwardvar = 1
-                            print(decoded_data)
-                        elif decoded_data == '\'s\' release':
-                            backwardvar = 0
-                            print(decoded_data)
-                        elif decoded_data == '\'d\' press':
-                            rightvar = 1
-                            print(decoded_data)
-                        elif decoded_data == '\'d\' release':
-                            rightvar = 0
-                            print(decoded_data)
-                except:
-                    if exit_program == 1:
-                        print(client_address, "has disconnected")
-                        break
-                    else:
-                        pass
-
-    threads = []
-    RobotThread = robotThread(1, "RobotThread", 1)
-    SocketThread = socketThread(2, "SocketThread", 2)
-
-    RobotThread.start()
-    SocketThread.start()
-
-    threads.append(RobotThread)
-    threads.append(SocketThread)
-    for t in threads:
-        t.join()
-        print("Program exited cleanly.")
-
-main()
\ No newline at end of file
+#Definte motor pins using BCM format
+#GPIO 19 & 26 or Board Pins 35 & 37 (left), GPIO 16 & 20 or Board Pins 36 & 38 (right)
+controller = GpioZeroRobotController(19, 26, 16, 20)
+# gpiozero calls can block; a single worker keeps them off the event loop and in order
+gpio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpio")
+
+def dispatch(record):
+    """Apply one client record to the key state. Returns False once the client asks to exit."""
+    result = apply_record(keystate, record)
+    if result is False:
+        exit_program.set()
+    if result is not None:
+        state_changed.set()
+        log.debug("%s", record)
+    return result is not False
+
+async def handle_client(reader, writer):
+    client_address = writer.get_extra_info("peername")
+    tune_client_socket(writer.get_extra_info("socket"))
+    log.info("%s has connected", client_address)
+    clients[writer] = asyncio.current_task()
+    try:
+        while dispatch(await reader.readexactly(RECORD_SIZE)):
+            pass
+    except asyncio.IncompleteReadError:
+        pass # client went away
+    except OSError as exc:
+        log.warning("%s connection error: %s", client_address, exc)
+    finally:
+        clients.pop(writer, None)
+        writer.close()
+        # Stop on disconnect to avoid runaway
+        keystate[:] = RELEASED
+        state_changed.set()
+    log.info("%s has disconnected", client_address)
+
+async def drive_robot():
+    """Apply key state changes to the motors until a client asks to exit."""
+    loop = asyncio.get_running_loop()
+    previousstate = 0 # index into STATE_NAMES
+    while True:
+        await state_changed.wait()
+        state_changed.clear()
+        if exit_program.is_set():
+            await loop.run_in_executor(gpio_executor, controller.stop)
+            log.info("stopping robot")
+            break
+        new_state = await loop.run_in_executor(gpio_executor, step, previousstate, tuple(keystate), controller)
+        if new_state != previousstate:
+            previousstate = new_state
+            log.debug(STATE_NAMES[new_state])
+
+async def main():
+    server = await asyncio.start_server(handle_client, HOST, PORT, backlog=4, reuse_address=True)
+    async with server:
+        await drive_robot()
+        server.close()
+        handlers = list(clients.values())
+        for writer in list(clients):
+            writer.close()
+        await asyncio.gather(*handlers)
+    gpio_executor.shutdown()
+
+log_listener = setup_logging()
+asyncio.run(main())
+log.info("Program exited cleanly.")
+log_listener.stop()
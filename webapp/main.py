@@ -1,90 +1,27 @@
 import asyncio
 import json
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Optional
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 
-
-class BaseRobotController:
-    """Abstract motor controller. Real implementation uses gpiozero on the Pi; development uses a mock."""
-
-    def forward(self) -> None:
-        raise NotImplementedError
-
-    def backward(self) -> None:
-        raise NotImplementedError
-
-    def left(self) -> None:
-        raise NotImplementedError
-
-    def right(self) -> None:
-        raise NotImplementedError
-
-    def stop(self) -> None:
-        raise NotImplementedError
-
-
-class MockRobotController(BaseRobotController):
-    def __init__(self) -> None:
-        self._last_cmd: str = "stop"
-
-    def _log(self, cmd: str) -> None:
-        if cmd != self._last_cmd:
-            print(f"[MOCK ROBOT] {cmd}")
-            self._last_cmd = cmd
-
-    def forward(self) -> None:
-        self._log("forward")
-
-    def backward(self) -> None:
-        self._log("backward")
-
-    def left(self) -> None:
-        self._log("left")
-
-    def right(self) -> None:
-        self._log("right")
-
-    def stop(self) -> None:
-        self._log("stop")
-
-
-class GpioZeroRobotController(BaseRobotController):
-    def __init__(self, left_forward_pin: int, left_backward_pin: int, right_forward_pin: int, right_backward_pin: int) -> None:
-        # Defer import so development machines without gpiozero still run
-        import gpiozero as gpio  # type: ignore
-
-        left_motor = gpio.Motor(forward=left_forward_pin, backward=left_backward_pin)
-        right_motor = gpio.Motor(forward=right_forward_pin, backward=right_backward_pin)
-        self.robot = gpio.Robot(left=left_motor, right=right_motor)
-
-    def forward(self) -> None:
-        self.robot.forward()
-
-    def backward(self) -> None:
-        self.robot.backward()
-
-    def left(self) -> None:
-        self.robot.left()
-
-    def right(self) -> None:
-        self.robot.right()
-
-    def stop(self) -> None:
-        self.robot.stop()
+from Server.controllers import BaseRobotController, GpioZeroRobotController, MockRobotController
 
 
 def create_controller() -> BaseRobotController:
     """Factory that selects the real controller on Pi or mock elsewhere.
 
-    Uses environment variable ROBOT_USE_MOCK=1 to force mock.
+    Uses environment variable ROBOT_USE_MOCK=1 to force mock, and ROBOT_MOCK_QUIET=1 to mute its output.
     """
     use_mock = os.environ.get("ROBOT_USE_MOCK", "0") == "1"
+    verbose = os.environ.get("ROBOT_MOCK_QUIET", "0") != "1"
     if use_mock:
-        return MockRobotController()
+        return MockRobotController(verbose=verbose)
     try:
         # Quick probe: import gpiozero
         import importlib
@@ -99,9 +36,11 @@ def create_controller() -> BaseRobotController:
         )
     except Exception as exc:  # noqa: BLE001 - best-effort detection
         print(f"gpiozero not available or failed to init ({exc}); using mock controller")
-        return MockRobotController()
+        return MockRobotController(verbose=verbose)
 
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="SocketRobot Web Controller")
 
 
@@ -133,23 +72,81 @@ class ControlState:
         }
 
 
+@lru_cache(maxsize=None)
+def _encode_state(forward: bool, backward: bool, left: bool, right: bool) -> str:
+    return json.dumps({"type": "state", "state": {"forward": forward, "backward": backward, "left": left, "right": right}}, separators=(",", ":"))
+
+
+def state_payload(control: ControlState) -> str:
+    """Encoded state message; there are only 16 distinct states, so each is serialized once."""
+    return _encode_state(control.forward, control.backward, control.left, control.right)
+
+
 controller: BaseRobotController = create_controller()
 state = ControlState()
+# Holds only the most recent state snapshot; intermediate ones are dropped
+latest: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=1)
 apply_task: Optional[asyncio.Task] = None
+# gpiozero calls can block for milliseconds; a single worker keeps them off the event loop and in order
+gpio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpio")
+
+# Upper bound on motor updates (200 Hz), independent of WebSocket traffic
+RECONCILE_INTERVAL = 0.005
+
+
+def publish_state() -> None:
+    """Hand the current state to the reconciler, replacing any snapshot it has not picked up yet."""
+    try:
+        latest.get_nowait()
+    except asyncio.QueueEmpty:
+        pass
+    latest.put_nowait(state.to_dict())
 
 
-def apply_state() -> None:
+def resolve_state(snapshot: dict) -> str:
+    """Resolve a state snapshot to a single controller command name."""
+    forward, backward, left, right = snapshot["forward"], snapshot["backward"], snapshot["left"], snapshot["right"]
     # Simple conflict resolution: forward/backward have priority, left/right only if no forward/backward
-    if state.forward and not state.backward:
-        controller.forward()
-    elif state.backward and not state.forward:
-        controller.backward()
-    elif state.left and not state.right and not state.forward and not state.backward:
-        controller.left()
-    elif state.right and not state.left and not state.forward and not state.backward:
-        controller.right()
+    if forward and not backward:
+        return "forward"
+    elif backward and not forward:
+        return "backward"
+    elif left and not right and not forward and not backward:
+        return "left"
+    elif right and not left and not forward and not backward:
+        return "right"
     else:
-        controller.stop()
+        return "stop"
+
+
+async def reconciler() -> None:
+    """Apply the latest state to the motors, only touching GPIO when the resolved command changes."""
+    loop = asyncio.get_running_loop()
+    last_cmd: Optional[str] = None
+    while True:
+        cmd = resolve_state(await latest.get())
+        if cmd != last_cmd:
+            try:
+                await loop.run_in_executor(gpio_executor, getattr(controller, cmd))
+                last_cmd = cmd
+            except Exception:  # noqa: BLE001 - keep reconciling; a dead task would leave the motors running
+                logger.exception("controller %s failed", cmd)
+                last_cmd = None
+        await asyncio.sleep(RECONCILE_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_reconciler() -> None:
+    global apply_task
+    apply_task = asyncio.create_task(reconciler())
+
+
+@app.on_event("shutdown")
+async def stop_reconciler() -> None:
+    if apply_task is not None:
+        apply_task.cancel()
+    await asyncio.get_running_loop().run_in_executor(gpio_executor, controller.stop)
+    gpio_executor.shutdown(wait=True)
 
 
 @app.websocket("/ws/control")
@@ -157,6 +154,8 @@ async def control_ws(ws: WebSocket) -> None:
     await ws.accept()
     try:
         await ws.send_json({"type": "hello", "state": state.to_dict()})
+        # Skip echoing state the client already has (e.g. keyboard autorepeat)
+        last_payload: Optional[str] = None
         while True:
             raw = await ws.receive_text()
             try:
@@ -179,8 +178,11 @@ async def control_ws(ws: WebSocket) -> None:
                     state.left = is_down
                 elif key == "d":
                     state.right = is_down
-                apply_state()
-                await ws.send_json({"type": "state", "state": state.to_dict()})
+                publish_state()
+                payload = state_payload(state)
+                if payload != last_payload:
+                    await ws.send_text(payload)
+                    last_payload = payload
 
             elif msg_type == "command":
                 cmd = str(data.get("cmd", "")).lower()
@@ -194,17 +196,23 @@ async def control_ws(ws: WebSocket) -> None:
                     state.forward, state.backward, state.left, state.right = False, False, False, True
                 elif cmd == "stop":
                     state.forward, state.backward, state.left, state.right = False, False, False, False
-                apply_state()
-                await ws.send_json({"type": "state", "state": state.to_dict()})
+                publish_state()
+                payload = state_payload(state)
+                if payload != last_payload:
+                    await ws.send_text(payload)
+                    last_payload = payload
 
             else:
                 await ws.send_json({"type": "error", "message": "unknown message"})
     except WebSocketDisconnect:
         # Stop on disconnect to avoid runaway
         state.forward = state.backward = state.left = state.right = False
-        apply_state()
-
+        publish_state()
 
-# Uvicorn entrypoint: uvicorn webapp.main:app --host 0.0.0.0 --port 8000
 
+# Uvicorn entrypoint: uvicorn webapp.main:app --host 0.0.0.0 --port 8000 --loop uvloop --http httptools
+if __name__ == "__main__":
+    import uvicorn
 
+    # uvloop/httptools come with uvicorn[standard]; "auto" falls back to asyncio/h11 where they are missing (Windows)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto", http="auto", ws="websockets")